@@ -1,22 +1,323 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory, make_response, send_file
+from flask import Flask, render_template, request, jsonify, send_from_directory, make_response, send_file, url_for, Response
+from flask.json.provider import JSONProvider
+from flask_compress import Compress
+from celery import Celery
+from celery.signals import before_task_publish
+from celery.result import AsyncResult
 from openai import OpenAI
-import json
+from cachetools import TTLCache
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, REGISTRY, generate_latest, multiprocess
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import httpx
+import fastjsonschema
+from fastjsonschema import JsonSchemaValueException
+import mmap
+import msgspec
+import orjson
 import os
+import re
+import threading
+import time
+import uuid
 from datetime import datetime
-import markdown
+from functools import lru_cache
+from string import Template
+from types import MappingProxyType
+from markdown_it import MarkdownIt
+from markupsafe import Markup
 import io
 
-app = Flask(__name__)
+class ORJSONProvider(JSONProvider):
+    """Route request.json and jsonify through orjson."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
-# Initialize OpenAI client with base URL for Azure OpenAI
+app = Flask(__name__)
+app.json = ORJSONProvider(app)
+
+# Compress responses on the wire; the report pages and JSON bodies are large
+# and highly repetitive. Streamed (SSE) responses are left alone so tokens
+# are flushed as soon as they arrive, and only text types are listed so
+# already-compressed files (PDFs, images) pass through untouched.
+app.config.update(
+    COMPRESS_ALGORITHM=['br', 'gzip'],
+    COMPRESS_MIMETYPES=[
+        'text/html',
+        'text/css',
+        'text/plain',
+        'text/javascript',
+        'application/javascript',
+        'application/json'
+    ],
+    COMPRESS_MIN_SIZE=1024,
+    COMPRESS_LEVEL=6,
+    COMPRESS_STREAMS=False
+)
+Compress(app)
+
+# Background report generation (mode=queue); defaults to the cache's Redis.
+# Without a broker and a result backend the queue is unavailable.
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", os.getenv("REDIS_URL"))
+CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", os.getenv("REDIS_URL"))
+celery = Celery(app.import_name, broker=CELERY_BROKER_URL, backend=CELERY_RESULT_BACKEND)
+
+@before_task_publish.connect
+def _mark_task_sent(headers=None, **kwargs):
+    # Celery reports unknown ids as PENDING forever; recording queued tasks
+    # lets report-status tell the two apart
+    celery.backend.store_result(headers['id'], None, 'SENT')
+
+# Retries use the SDK's exponential backoff on connection errors, 429s and 5xx
+OPENAI_MAX_RETRIES = 5
+OPENAI_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
+# Initialize OpenAI client with base URL for Azure OpenAI. Every request
+# shares it, so the pooled httpx client keeps TLS connections alive between
+# requests and the connection limit caps concurrent calls per process.
 client = OpenAI(
     api_key=os.getenv("OPENAI_API_KEY"),  # Read from environment variable
-    base_url="https://api.openai.com/v1"  # Optional, default already points here
+    base_url="https://api.openai.com/v1",  # Optional, default already points here
+    max_retries=OPENAI_MAX_RETRIES,
+    timeout=OPENAI_TIMEOUT,
+    http_client=httpx.Client(
+        limits=httpx.Limits(max_keepalive_connections=50, max_connections=100)
+    )
+)
+
+class RateLimiter:
+    """Token bucket shared by every thread in the process.
+
+    Each acquire reserves the next free slot and then waits for it, so
+    callers queue in order instead of all retrying once the bucket refills.
+    """
+
+    def __init__(self, per_minute, burst=10):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            OPENAI_RATE_LIMITED.inc()
+        return wait
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait:
+            time.sleep(wait)
+
+OPENAI_CALLS = Counter('openai_calls', 'Chat completion requests sent to OpenAI')
+OPENAI_CACHE_HITS = Counter('openai_cache_hits', 'Chat completions served from a cache', ['cache'])
+OPENAI_RATE_LIMITED = Counter('openai_rate_limited', 'Chat completions delayed by the rate limiter')
+
+# Requests per minute this process may send; size it to the org limit
+# divided by the number of worker processes
+openai_limiter = RateLimiter(int(os.getenv("OPENAI_RPM", "500")))
+
+LLM_CACHE_TTL = 7 * 24 * 3600
+
+class LLMCache:
+    """Exact-match cache of chat completion text, keyed on the request payload.
+
+    Entries live in an in-process TTL cache and, when a Redis URL is given,
+    in Redis as well so every worker shares them.
+    """
+
+    def __init__(self, ttl=LLM_CACHE_TTL, maxsize=1024, redis_url=None):
+        self.ttl = ttl
+        self._local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._redis = None
+        if redis_url:
+            import redis
+            self._redis = redis.Redis.from_url(redis_url)
+
+    @staticmethod
+    def _key(model, messages, **kw):
+        payload = {"model": model, "messages": messages, **kw}
+        return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            value = self._local.get(key)
+        if value is None and self._redis is not None:
+            try:
+                value = self._redis.get(f"llm:{key}")
+            except Exception as e:
+                app.logger.warning(f"LLM cache lookup failed: {str(e)}")
+            if value is not None:
+                value = value.decode()
+                with self._lock:
+                    self._local[key] = value
+        if value is not None:
+            OPENAI_CACHE_HITS.labels(cache="exact").inc()
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._local[key] = value
+        if self._redis is not None:
+            try:
+                self._redis.setex(f"llm:{key}", self.ttl, value)
+            except Exception as e:
+                app.logger.warning(f"LLM cache store failed: {str(e)}")
+
+llm_cache = LLMCache(redis_url=os.getenv("REDIS_URL"))
+
+class SemanticLLMCache:
+    """Cache that returns a stored response for prompts with similar embeddings.
+
+    Backed by a RedisVL SemanticCache and disabled (every lookup misses)
+    without a Redis URL. Entries are tagged with a scope so only requests with
+    the same scope can share a response. The
+    index is created on first use; if Redis or the embedding API is
+    unavailable then, the cache stays disabled for the life of the process.
+    """
+
+    def __init__(self, name, redis_url=None, distance_threshold=0.1, ttl=LLM_CACHE_TTL):
+        self.name = name
+        self.redis_url = redis_url
+        self.distance_threshold = distance_threshold
+        self.ttl = ttl
+        self._cache = None
+        self._vectorizer = None
+        self._enabled = bool(redis_url)
+        self._lock = threading.Lock()
+
+    def _get(self):
+        with self._lock:
+            if self._cache is None and self._enabled:
+                try:
+                    from redisvl.extensions.cache.llm import SemanticCache
+                    from redisvl.utils.vectorize import OpenAITextVectorizer
+
+                    self._vectorizer = OpenAITextVectorizer(
+                        model="text-embedding-3-small",
+                        api_config={"api_key": os.getenv("OPENAI_API_KEY")}
+                    )
+                    self._cache = SemanticCache(
+                        name=self.name,
+                        redis_url=self.redis_url,
+                        distance_threshold=self.distance_threshold,
+                        ttl=self.ttl,
+                        vectorizer=self._vectorizer,
+                        filterable_fields=[{"name": "scope", "type": "tag"}]
+                    )
+                except Exception as e:
+                    app.logger.warning(f"Semantic cache '{self.name}' disabled: {str(e)}")
+                    self._enabled = False
+            return self._cache
+
+    def lookup(self, prompt, scope):
+        """Return ``(response, vector)``; response is None on a miss.
+
+        Pass the vector on to store() so the prompt is only embedded once.
+        """
+        cache = self._get()
+        if cache is None:
+            return None, None
+
+        from redisvl.query.filter import Tag
+
+        try:
+            vector = self._vectorizer.embed(prompt)
+            hits = cache.check(
+                vector=vector,
+                num_results=1,
+                return_fields=["response"],
+                filter_expression=Tag("scope") == scope
+            )
+        except Exception as e:
+            app.logger.warning(f"Semantic cache lookup failed: {str(e)}")
+            return None, None
+        if not hits:
+            return None, vector
+        OPENAI_CACHE_HITS.labels(cache=self.name).inc()
+        return hits[0]["response"], vector
+
+    def store(self, prompt, response, scope, vector):
+        if vector is None or self._get() is None:
+            return
+        try:
+            self._cache.store(prompt, response, vector=vector, filters={"scope": scope})
+        except Exception as e:
+            app.logger.warning(f"Semantic cache store failed: {str(e)}")
+
+# Questions match at cosine similarity >= 0.92
+ask_semantic_cache = SemanticLLMCache(
+    "accredit-ask", redis_url=os.getenv("REDIS_URL"), distance_threshold=0.08
 )
 
-# Load assessment questions
-with open('backend/questions.json', 'r') as f:
-    ASSESSMENT_QUESTIONS = json.load(f)
+def cached_completion(parse=None, **kwargs):
+    """Return the completion text for ``kwargs``, served from llm_cache when possible.
+
+    If ``parse`` is given it is applied to the text and its result returned;
+    a response that fails to parse, is empty or was cut off is not cached.
+    """
+    key = llm_cache._key(**kwargs)
+    content = llm_cache.get(key)
+    if content is not None:
+        return parse(content) if parse else content
+
+    openai_limiter.acquire()
+    OPENAI_CALLS.inc()
+    response = client.chat.completions.create(**kwargs)
+    choice = response.choices[0]
+    content = choice.message.content
+    result = parse(content) if parse else content
+    if content and choice.finish_reason == 'stop':
+        llm_cache.set(key, content)
+    return result
+
+# One Markdown parser for the process. Rendering keeps no state on the
+# parser, so it is safe to share between threads.
+MARKDOWN = MarkdownIt("commonmark").enable("table")
+
+@lru_cache(maxsize=128)
+def _render_markdown(report):
+    # Sharing the same report again skips the parse entirely
+    return MARKDOWN.render(report)
+
+# The report stylesheet is linked with a content hash so browsers can cache
+# it indefinitely and still pick up changes
+with open('static/css/report.css', 'rb') as f:
+    app.jinja_env.globals['report_css_version'] = hashlib.sha256(f.read()).hexdigest()[:12]
+
+@app.after_request
+def cache_report_css(response):
+    if request.path == '/static/css/report.css':
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+    return response
+
+def _freeze(value):
+    """Recursively convert dicts to read-only mappings and lists to tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+# Load assessment questions once, read-only, so they can't be mutated by a
+# request and stay shared between workers forked from a preloaded parent
+with open('backend/questions.json', 'rb') as f:
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+        ASSESSMENT_QUESTIONS = _freeze(orjson.loads(view))
 
 @app.route('/')
 def index():
@@ -30,205 +331,540 @@ def assessment():
 def serve_data(filename):
     return send_from_directory('static/data', filename)
 
+# Request payload validators, compiled to Python code once at import
+_validate_assessment_results = fastjsonschema.compile({
+    "type": "array",
+    "minItems": 1,
+    "items": {
+        "type": "object",
+        "required": ["category", "question", "rating"],
+        "properties": {
+            "category": {"type": "string"},
+            "question": {"type": "string"},
+            "rating": {"type": "integer", "minimum": 1, "maximum": 4}
+        }
+    }
+})
+_validate_institution_info = fastjsonschema.compile({
+    "type": "object",
+    "additionalProperties": {"type": ["string", "number", "null"]}
+})
+
+def _payload_error(data):
+    """Return why an assessment request payload is invalid, or None if it's fine."""
+    if not isinstance(data, dict):
+        return "request body must be a JSON object"
+    try:
+        _validate_assessment_results(data.get('assessment_results', []), name_prefix='assessment_results')
+        _validate_institution_info(data.get('institution_info', {}), name_prefix='institution_info')
+    except JsonSchemaValueException as e:
+        return e.message
+    return None
+
+class Recommendation(msgspec.Struct):
+    category: str
+    items: list[str]
+
+class RecommendationsPayload(msgspec.Struct):
+    """Schema the recommendations model output must match."""
+    recommendations: list[Recommendation]
+    evidence: list[str]
+    kpis: list[str]
+
+@lru_cache(maxsize=1)
+def _recommendations_decoder():
+    # Built once; the decoder holds the compiled schema for every later call
+    return msgspec.json.Decoder(RecommendationsPayload)
+
+def _parse_recommendations(content):
+    # Parses and validates in a single pass
+    try:
+        return _recommendations_decoder().decode(content)
+    except msgspec.DecodeError:
+        app.logger.error(f"Response content: {content}")
+        raise
+
+def _generate_category_recommendations(category, results):
+    # Compact rows cost far fewer prompt tokens than indented JSON
+    rows = "\n".join(f"{category}\t{result['question']}\t{result['rating']}" for result in results)
+
+    # Prepare the prompt for OpenAI
+    prompt = """Analyze the following assessment results for a university program and generate specific recommendations.
+    The assessment uses a 1-4 scale where 1-2 indicates weak performance, 3 indicates moderate performance, and 4 indicates strong performance.
+
+    Assessment Results (tab-separated category, question, rating):
+    {}
+
+    Based on these results, provide recommendations, evidence requirements, and KPIs.
+    Focus particularly on areas rated 3 or lower that need improvement.""".format(rows)
+
+    completion_request = {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {
+                "role": "system",
+                "content": """You are an expert in university program assessment and accreditation.
+                You must respond with a valid JSON object containing exactly these keys:
+                - recommendations: array of objects with 'category' and 'items' keys
+                - evidence: array of strings
+                - kpis: array of strings"""
+            },
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0,
+        "max_tokens": 800,
+        "response_format": {"type": "json_object"}  # Force JSON response
+    }
+
+    # The question text is fixed, so only an exact repeat of the ratings can
+    # reuse a response; the exact cache keyed on the rows covers that
+    return cached_completion(parse=_parse_recommendations, **completion_request)
+
+# Shared by all requests, so it also caps concurrent category calls per process
+_recommendations_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix='recommendations')
+
 @app.route('/api/generate-recommendations', methods=['POST'])
 def generate_recommendations():
     data = request.json
+    error = _payload_error(data)
+    if error:
+        return jsonify({"error": error}), 400
+
     assessment_results = data.get('assessment_results', [])
     
     # Group results by category
-    results_by_category = {}
+    results_by_category = defaultdict(list)
     for result in assessment_results:
-        if result['category'] not in results_by_category:
-            results_by_category[result['category']] = []
         results_by_category[result['category']].append(result)
-    
-    # Prepare the prompt for OpenAI
-    prompt = """Analyze the following assessment results for a university program and generate specific recommendations.
-    The assessment uses a 1-4 scale where 1-2 indicates weak performance, 3 indicates moderate performance, and 4 indicates strong performance.
-
-    Assessment Results by Category:
-    {}
-
-    Based on these results, provide recommendations, evidence requirements, and KPIs.
-    Focus particularly on areas rated 3 or lower that need improvement.""".format(
-        json.dumps(results_by_category, indent=2)
-    )
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4-turbo-preview",
-            messages=[
-                {
-                    "role": "system",
-                    "content": """You are an expert in university program assessment and accreditation.
-                    You must respond with a valid JSON object containing exactly these keys:
-                    - recommendations: array of objects with 'category' and 'items' keys
-                    - evidence: array of strings
-                    - kpis: array of strings"""
-                },
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1500,
-            response_format={"type": "json_object"}  # Force JSON response
-        )
-        
-        # Parse and validate the response
+        # One request per category, all in flight at once
+        futures = [
+            _recommendations_pool.submit(_generate_category_recommendations, category, results)
+            for category, results in results_by_category.items()
+        ]
         try:
-            recommendations = json.loads(response.choices[0].message.content)
-            
-            # Validate response structure
-            if not isinstance(recommendations, dict):
-                raise ValueError("Response is not a dictionary")
-            
-            required_keys = ['recommendations', 'evidence', 'kpis']
-            if not all(key in recommendations for key in required_keys):
-                raise ValueError(f"Missing required keys. Expected: {required_keys}")
-            
-            if not isinstance(recommendations['recommendations'], list):
-                raise ValueError("'recommendations' must be an array")
-            
-            if not isinstance(recommendations['evidence'], list):
-                raise ValueError("'evidence' must be an array")
-            
-            if not isinstance(recommendations['kpis'], list):
-                raise ValueError("'kpis' must be an array")
-            
-            # Validate recommendations structure
-            for rec in recommendations['recommendations']:
-                if not isinstance(rec, dict) or 'category' not in rec or 'items' not in rec:
-                    raise ValueError("Invalid recommendation format")
-                if not isinstance(rec['items'], list):
-                    raise ValueError("Recommendation items must be an array")
-            
-            return jsonify(recommendations)
-            
-        except json.JSONDecodeError as e:
-            app.logger.error(f"Failed to parse OpenAI response as JSON: {str(e)}")
-            app.logger.error(f"Response content: {response.choices[0].message.content}")
-            return jsonify({"error": "Failed to generate valid recommendations"}), 500
-            
-        except ValueError as e:
-            app.logger.error(f"Invalid response format: {str(e)}")
-            return jsonify({"error": "Invalid recommendations format"}), 500
+            parts = [future.result() for future in futures]
+        except Exception:
+            # Don't start categories whose results would be thrown away
+            for future in futures:
+                future.cancel()
+            raise
+
+        # Merge the per-category responses, dropping duplicate evidence/KPIs
+        recommendations = RecommendationsPayload(recommendations=[], evidence=[], kpis=[])
+        for part in parts:
+            recommendations.recommendations.extend(part.recommendations)
+            for item in part.evidence:
+                if item not in recommendations.evidence:
+                    recommendations.evidence.append(item)
+            for item in part.kpis:
+                if item not in recommendations.kpis:
+                    recommendations.kpis.append(item)
+
+        return jsonify(msgspec.to_builtins(recommendations))
+
+    except msgspec.ValidationError as e:
+        app.logger.error(f"Invalid response format: {str(e)}")
+        return jsonify({"error": "Invalid recommendations format"}), 500
+
+    except msgspec.DecodeError as e:
+        app.logger.error(f"Failed to parse OpenAI response as JSON: {str(e)}")
+        return jsonify({"error": "Failed to generate valid recommendations"}), 500
             
     except Exception as e:
         app.logger.error(f"Error generating recommendations: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+# Everything that doesn't vary between reports, built once and sent as the
+# leading system message; only the short user message changes per request
+_REPORT_SYS = """You are an expert in program assessment and accreditation. Generate a detailed, professional report with specific recommendations and KPIs for each standard. Format all content in tables as bullet points for better readability.
+
+Generate a comprehensive program assessment report with the following structure:
+
+First, start with a summary of the program information given by the user:
+
+Section A: GENERAL INFORMATION
+- Institution Name, Program Name, Year Established, Total Number of Graduates, First Graduating Batch, Current Number of Students, Number of Faculty Members, Program Tracks and Total Credit Hours
+
+Then, analyze the assessment results for each standard and generate specific recommendations.
+The assessment uses a 4-point scale where:
+1 = Non-Compliant
+2 = Minimal Compliance
+3 = Substantial Compliance
+4 = Full Compliance
+
+For each standard, provide a detailed analysis in a single table with four columns:
+| Strengths | Weaknesses | Recommendations | Key Performance Indicators (KPIs) |
+
+Important formatting rules:
+1. Each cell should contain bullet points starting with "• "
+2. For every weakness point identified, there MUST be a corresponding recommendation that directly addresses it
+3. All KPIs must be specific, measurable, and quantifiable with clear metrics
+4. Each standard's table should be presented as a single row with four columns
+5. Ensure recommendations are actionable and specific
+
+Required KPIs for each standard (in addition to other relevant KPIs):
+
+Section A: PROGRAM MANAGEMENT and QUALITY ASSURANCE: 
+• Percentage of achieved program operational plan objectives (Target: %)
+• Program satisfaction rate from stakeholders (Target: %)
+• Number of quality improvement initiatives implemented per year (Target: #)
+
+Standard 2: TEACHING and LEARNING: 
+• Students' overall satisfaction with learning experience (Target: %)
+• Course satisfaction rate (Target: %)
+• Employer satisfaction rate with graduates' performance (Target: %)
+• Course completion rate (Target: %)
+
+Standard 3: STUDENTS: 
+• Student-to-faculty ratio (Target: #:1)
+• Average time to graduation (Target: # years)
+• Student retention rate (Target: %)
+• Graduate employment rate within 6 months (Target: %)
+
+Standard 4: FACULTY: 
+• Percentage of faculty with terminal degrees (Target: %)
+• Faculty retention rate (Target: %)
+• Faculty research publications per year (Target: # per faculty)
+• Faculty professional development participation rate (Target: %)
+
+Standard 5: LEARNING RESOURCES, FACILITIES, and EQUIPMENT: 
+• Student satisfaction with learning resources (Target: %)
+• Faculty satisfaction with teaching facilities (Target: %)
+• Resource utilization rate (Target: %)
+• Annual technology refresh rate (Target: %)
+
+After the analysis of each standard, provide a concise executive summary that includes:
+1. One key strength for each standard (exactly one, the most significant)
+2. The main weaknesses that require immediate attention (prioritized)
+3. The corresponding recommendations for these critical weaknesses
+4. An overall assessment of the program's compliance level
+
+Format the report in Markdown with proper headings and tables.
+Make all tables full-width and ensure consistent formatting throughout.
+Use bullet points for all lists within table cells.
+If any data point is missing, use a '-' as a placeholder."""
+
+# Per-request part of the report prompt
+REPORT_PROMPT = Template("""Institution Name: $institution_name
+Program Name: $program_name
+Year Established: $year_established
+Total Number of Graduates: $total_graduates
+First Graduating Batch: $first_graduating_batch
+Current Number of Students: $current_students
+Number of Faculty Members: $faculty_members
+Program Tracks: $program_tracks
+Total Credit Hours: $credit_hours
+
+Assessment Results by Category:
+$assessment_results
+
+Recommendations:
+$recommendations""")
+
+def _report_prompt(institution_info, assessment_results, recommendations):
+    return REPORT_PROMPT.safe_substitute(
+        institution_name=institution_info.get('institutionName', '-'),
+        program_name=institution_info.get('programName', '-'),
+        year_established=institution_info.get('yearEstablished', '-'),
+        total_graduates=institution_info.get('totalGraduates', '-'),
+        first_graduating_batch=institution_info.get('firstGraduatingBatch', '-'),
+        current_students=institution_info.get('currentStudents', '-'),
+        faculty_members=institution_info.get('facultyMembers', '-'),
+        program_tracks=institution_info.get('programTracks', '-'),
+        credit_hours=institution_info.get('creditHours', '-'),
+        assessment_results=orjson.dumps(assessment_results).decode(),
+        recommendations=recommendations
+    )
+
+def _report_request(institution_info, assessment_results, recommendations):
+    """Build the chat completion parameters for the assessment report."""
+    # Prepare the prompt for OpenAI
+    prompt = _report_prompt(
+        institution_info,
+        assessment_results,
+        orjson.dumps(recommendations).decode()
+    )
+
+    return {
+        "model": "gpt-4-turbo-preview",
+        "messages": [
+            {"role": "system", "content": _REPORT_SYS},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0,
+        "max_tokens": 2000
+    }
+
+class FullPayload(msgspec.Struct):
+    """Schema of the combined recommendations-and-report model output."""
+    recommendations: RecommendationsPayload
+    report: str
+
+@lru_cache(maxsize=1)
+def _full_decoder():
+    return msgspec.json.Decoder(FullPayload)
+
+def _parse_full(content):
+    try:
+        return _full_decoder().decode(content)
+    except msgspec.DecodeError:
+        app.logger.error(f"Response content: {content}")
+        raise
+
+def _full_request(institution_info, assessment_results):
+    """Build one chat completion that returns both the recommendations and the report."""
+    prompt = _report_prompt(
+        institution_info,
+        assessment_results,
+        'Generate these first and return them under the "recommendations" key.'
+    )
+
+    return {
+        "model": "gpt-4-turbo-preview",
+        "messages": [
+            {"role": "system", "content": _REPORT_SYS},
+            {
+                "role": "system",
+                "content": """You must respond with a valid JSON object containing exactly these keys:
+                - recommendations: object with 'recommendations' (array of objects with 'category' and 'items' keys), 'evidence' (array of strings) and 'kpis' (array of strings)
+                - report: the full report as a Markdown string, with all content in tables as bullet points"""
+            },
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0,
+        # The model's output limit: the JSON-escaped report alone may use 2000
+        # tokens, and truncated output can't be decoded
+        "max_tokens": 4096,
+        "response_format": {"type": "json_object"}
+    }
+
+@celery.task
+def _gen_report_task(data):
+    """Generate a report outside the request cycle; the result is the Markdown."""
+    completion_request = _report_request(
+        data.get('institution_info', {}),
+        data.get('assessment_results', []),
+        data.get('recommendations', {})
+    )
+    return cached_completion(**completion_request)
+
+def _submit_batch(body, kind="report"):
+    """Queue a single chat completion on the OpenAI Batch API."""
+    line = orjson.dumps({
+        "custom_id": f"{kind}-{uuid.uuid4()}",
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": body
+    })
+    batch_file = client.files.create(
+        file=("report.jsonl", line),
+        purpose="batch"
+    )
+    return client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+
+def _sse(data, event=None):
+    """Format one Server-Sent Event with a JSON payload."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {orjson.dumps(data).decode()}\n\n"
+
+def _sse_response(stream):
+    return Response(
+        stream,
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def _stream_completion(completion_request, on_complete=None, use_cache=True):
+    """Yield a chat completion as Server-Sent Events, one event per token chunk.
+
+    Cache hits are sent as a single event. A stream that finishes normally
+    with some text is cached and passed to ``on_complete``; empty or
+    truncated output is sent but not kept. With ``use_cache=False``
+    llm_cache is skipped and only ``on_complete`` sees the text.
+    """
+    key = llm_cache._key(**completion_request)
+    content = llm_cache.get(key) if use_cache else None
+    if content is not None:
+        yield _sse(content)
+    else:
+        chunks = []
+        finish_reason = None
+        try:
+            openai_limiter.acquire()
+            OPENAI_CALLS.inc()
+            for chunk in client.chat.completions.create(**completion_request, stream=True):
+                if not chunk.choices:
+                    continue
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    chunks.append(delta)
+                    yield _sse(delta)
+        except Exception as e:
+            app.logger.error(f"Error streaming completion: {str(e)}")
+            yield _sse(str(e), event='error')
+            return
+        content = ''.join(chunks)
+        if content and finish_reason == 'stop':
+            if use_cache:
+                llm_cache.set(key, content)
+            if on_complete:
+                on_complete(content)
+
+    yield _sse({}, event='done')
+
 @app.route('/api/generate-report', methods=['POST'])
 def generate_report():
     try:
         data = request.json
+        error = _payload_error(data)
+        if error:
+            return jsonify({"error": error}), 400
+
         institution_info = data.get('institution_info', {})
         assessment_results = data.get('assessment_results', [])
         recommendations = data.get('recommendations', {})
-
-        # Prepare the prompt for OpenAI
-        prompt = f"""
-        Generate a comprehensive program assessment report with the following structure:
-
-        First, start with a summary of the program information:
-
-        Section A: GENERAL INFORMATION
-        - Institution Name: {institution_info.get('institutionName', '-')}
-        - Program Name: {institution_info.get('programName', '-')}
-        - Year Established: {institution_info.get('yearEstablished', '-')}
-        - Total Number of Graduates: {institution_info.get('totalGraduates', '-')}
-        - First Graduating Batch: {institution_info.get('firstGraduatingBatch', '-')}
-        - Current Number of Students: {institution_info.get('currentStudents', '-')}
-        - Number of Faculty Members: {institution_info.get('facultyMembers', '-')}
-        - Program Tracks: {institution_info.get('programTracks', '-')}
-        - Total Credit Hours: {institution_info.get('creditHours', '-')}
-
-        Then, analyze the following assessment results for each standard and generate specific recommendations.
-        The assessment uses a 4-point scale where:
-        1 = Non-Compliant
-        2 = Minimal Compliance
-        3 = Substantial Compliance
-        4 = Full Compliance
-
-        Assessment Results by Category:
-        {json.dumps(assessment_results, indent=2)}
-
-        Recommendations:
-        {json.dumps(recommendations, indent=2)}
-
-        For each standard, provide a detailed analysis in a single table with four columns:
-        | Strengths | Weaknesses | Recommendations | Key Performance Indicators (KPIs) |
-
-        Important formatting rules:
-        1. Each cell should contain bullet points starting with "• "
-        2. For every weakness point identified, there MUST be a corresponding recommendation that directly addresses it
-        3. All KPIs must be specific, measurable, and quantifiable with clear metrics
-        4. Each standard's table should be presented as a single row with four columns
-        5. Ensure recommendations are actionable and specific
-
-        Required KPIs for each standard (in addition to other relevant KPIs):
-
-        Section A: PROGRAM MANAGEMENT and QUALITY ASSURANCE: 
-        • Percentage of achieved program operational plan objectives (Target: %)
-        • Program satisfaction rate from stakeholders (Target: %)
-        • Number of quality improvement initiatives implemented per year (Target: #)
-
-        Standard 2: TEACHING and LEARNING: 
-        • Students' overall satisfaction with learning experience (Target: %)
-        • Course satisfaction rate (Target: %)
-        • Employer satisfaction rate with graduates' performance (Target: %)
-        • Course completion rate (Target: %)
-
-        Standard 3: STUDENTS: 
-        • Student-to-faculty ratio (Target: #:1)
-        • Average time to graduation (Target: # years)
-        • Student retention rate (Target: %)
-        • Graduate employment rate within 6 months (Target: %)
-
-        Standard 4: FACULTY: 
-        • Percentage of faculty with terminal degrees (Target: %)
-        • Faculty retention rate (Target: %)
-        • Faculty research publications per year (Target: # per faculty)
-        • Faculty professional development participation rate (Target: %)
-
-        Standard 5: LEARNING RESOURCES, FACILITIES, and EQUIPMENT: 
-        • Student satisfaction with learning resources (Target: %)
-        • Faculty satisfaction with teaching facilities (Target: %)
-        • Resource utilization rate (Target: %)
-        • Annual technology refresh rate (Target: %)
-
-        After the analysis of each standard, provide a concise executive summary that includes:
-        1. One key strength for each standard (exactly one, the most significant)
-        2. The main weaknesses that require immediate attention (prioritized)
-        3. The corresponding recommendations for these critical weaknesses
-        4. An overall assessment of the program's compliance level
-
-        Format the report in Markdown with proper headings and tables.
-        Make all tables full-width and ensure consistent formatting throughout.
-        Use bullet points for all lists within table cells.
-        If any data point is missing, use a '-' as a placeholder.
-        """
+        completion_request = _report_request(institution_info, assessment_results, recommendations)
+        mode = request.args.get('mode')
+
+        # Non-interactive callers can trade latency for the cheaper Batch API
+        if mode == 'batch':
+            batch = _submit_batch(completion_request)
+            return jsonify({
+                "batch_id": batch.id,
+                "status_url": url_for('report_status', job_id=batch.id)
+            }), 202
+
+        # Or hand the whole job to a background worker and poll for it
+        if mode == 'queue':
+            if not (CELERY_BROKER_URL and CELERY_RESULT_BACKEND):
+                return jsonify({"error": "Report queue is not configured"}), 503
+            task = _gen_report_task.delay(data)
+            return jsonify({
+                "task_id": task.id,
+                "status_url": url_for('report_status', job_id=task.id)
+            }), 202
+
+        # Interactive callers get tokens as they arrive instead of waiting
+        # for the whole report
+        if mode == 'stream':
+            return _sse_response(_stream_completion(completion_request))
 
         # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4-turbo-preview",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert in program assessment and accreditation. Generate a detailed, professional report with specific recommendations and KPIs for each standard. Format all content in tables as bullet points for better readability."
-                },
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=2000
+        report = cached_completion(**completion_request)
+        return jsonify({"report": report})
+
+    except Exception as e:
+        app.logger.error(f"Error generating report: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/generate-full', methods=['POST'])
+def generate_full():
+    """Generate the recommendations and the report in a single model call."""
+    try:
+        data = request.json
+        error = _payload_error(data)
+        if error:
+            return jsonify({"error": error}), 400
+
+        # The assessment is sent once instead of once per endpoint
+        completion_request = _full_request(
+            data.get('institution_info', {}),
+            data.get('assessment_results', [])
         )
 
-        report = response.choices[0].message.content
+        if request.args.get('mode') == 'batch':
+            batch = _submit_batch(completion_request, kind="full")
+            return jsonify({
+                "batch_id": batch.id,
+                "status_url": url_for('report_status', job_id=batch.id)
+            }), 202
 
-        return jsonify({"report": report})
+        full = cached_completion(parse=_parse_full, **completion_request)
+
+        return jsonify(msgspec.to_builtins(full))
+
+    except msgspec.ValidationError as e:
+        app.logger.error(f"Invalid response format: {str(e)}")
+        return jsonify({"error": "Invalid response format"}), 500
+
+    except msgspec.DecodeError as e:
+        app.logger.error(f"Failed to parse OpenAI response as JSON: {str(e)}")
+        return jsonify({"error": "Failed to generate a valid report"}), 500
 
     except Exception as e:
         app.logger.error(f"Error generating report: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/report-status/<job_id>')
+def report_status(job_id):
+    try:
+        # Queued jobs have Celery task ids; OpenAI batch ids start with 'batch_'
+        if not job_id.startswith('batch_'):
+            if not CELERY_RESULT_BACKEND:
+                return jsonify({"error": "Unknown job id"}), 404
+            result = AsyncResult(job_id, app=celery)
+            if result.state == 'PENDING':
+                return jsonify({"error": "Unknown job id"}), 404
+            status = {"task_id": job_id, "status": result.state.lower()}
+            if result.successful():
+                status["report"] = result.result
+            elif result.failed():
+                status["error"] = str(result.result)
+            return jsonify(status)
+
+        batch = client.batches.retrieve(job_id)
+        status = {"batch_id": batch.id, "status": batch.status}
+
+        if batch.status == 'completed':
+            # A failed request still completes the batch, but its line goes to
+            # the error file and no output file is written
+            file_id = batch.output_file_id or batch.error_file_id
+            if not file_id:
+                status["error"] = "Batch produced no output"
+                return jsonify(status)
+
+            output = client.files.content(file_id)
+            result = orjson.loads(output.text.splitlines()[0])
+            response = result.get('response') or {}
+            error = result.get('error') or response.get('body', {}).get('error')
+            if error or response.get('status_code') != 200:
+                status["error"] = (error or {}).get('message', 'Batch request failed')
+            else:
+                content = result['response']['body']['choices'][0]['message']['content']
+                if result['custom_id'].startswith('full-'):
+                    status.update(msgspec.to_builtins(_parse_full(content)))
+                else:
+                    status["report"] = content
+
+        elif batch.status in ('failed', 'expired', 'cancelled'):
+            status["error"] = f"Batch {batch.status}"
+
+        return jsonify(status)
+
+    except Exception as e:
+        app.logger.error(f"Error retrieving report status: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# Compiled once at import; rendering skips render_template's lookup and
+# context-processor pass
+REPORT_TEMPLATE = app.jinja_env.get_template('report_shell.html')
+
+def _render_report_page(inner_html, institution_info):
+    """Wrap report HTML in the standalone report page, as a JSON response."""
+    html_report = REPORT_TEMPLATE.render(
+        institution_info=institution_info,
+        generated_on=datetime.now().strftime('%B %d, %Y'),
+        content=Markup(inner_html)
+    )
+    return Response(orjson.dumps({"html_report": html_report}), mimetype='application/json')
+
 @app.route('/api/generate-pdf', methods=['POST'])
 def generate_pdf():
     try:
@@ -236,282 +872,7 @@ def generate_pdf():
         html_content = data.get('html_content')
         institution_info = data.get('institution_info', {})
 
-        # Create a beautiful HTML report instead of PDF
-        complete_html = f"""
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Program Assessment Report - {institution_info.get('programName', 'Program')}</title>
-            <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap" rel="stylesheet">
-            <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css">
-            <style>
-                * {{
-                    margin: 0;
-                    padding: 0;
-                    box-sizing: border-box;
-                }}
-                
-                body {{
-                    font-family: 'Inter', Arial, Helvetica, sans-serif;
-                    line-height: 1.6;
-                    color: #2c3e50;
-                    background-color: #f8f9fa;
-                    padding: 2rem;
-                }}
-                
-                .report-container {{
-                    max-width: 1200px;
-                    margin: 0 auto;
-                    background: white;
-                    border-radius: 12px;
-                    box-shadow: 0 10px 30px rgba(0,0,0,0.1);
-                    overflow: hidden;
-                }}
-                
-                .report-header {{
-                    background: linear-gradient(135deg, #2874a6 0%, #3498db 100%);
-                    color: white;
-                    padding: 3rem 2rem;
-                    text-align: center;
-                }}
-                
-                .report-header h1 {{
-                    font-size: 2.5rem;
-                    font-weight: 700;
-                    margin-bottom: 1rem;
-                }}
-                
-                .report-header h2 {{
-                    font-size: 1.5rem;
-                    font-weight: 500;
-                    margin-bottom: 0.5rem;
-                    opacity: 0.9;
-                }}
-                
-                .report-header p {{
-                    font-size: 1.1rem;
-                    opacity: 0.8;
-                }}
-                
-                .report-content {{
-                    padding: 3rem 2rem;
-                }}
-                
-                .report-content h1 {{
-                    color: #2874a6;
-                    font-size: 2rem;
-                    margin-bottom: 1.5rem;
-                    padding-bottom: 1rem;
-                    border-bottom: 3px solid #3498db;
-                }}
-                
-                .report-content h2 {{
-                    color: #2874a6;
-                    font-size: 1.5rem;
-                    margin: 2rem 0 1rem;
-                    padding-bottom: 0.5rem;
-                    border-bottom: 1px solid #e9ecef;
-                }}
-                
-                .report-content h3 {{
-                    color: #2c3e50;
-                    font-size: 1.2rem;
-                    margin: 1.5rem 0 0.75rem;
-                }}
-                
-                .report-content p {{
-                    margin-bottom: 1rem;
-                    font-size: 1.1rem;
-                }}
-                
-                .report-content table {{
-                    width: 100%;
-                    border-collapse: collapse;
-                    margin: 1.5rem 0;
-                    background: white;
-                    border-radius: 8px;
-                    overflow: hidden;
-                    box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-                }}
-                
-                .report-content th {{
-                    background: #2874a6;
-                    color: white;
-                    padding: 1rem;
-                    text-align: left;
-                    font-weight: 600;
-                    font-size: 1rem;
-                }}
-                
-                .report-content td {{
-                    padding: 1rem;
-                    border-bottom: 1px solid #e9ecef;
-                    vertical-align: top;
-                }}
-                
-                .report-content tr:nth-child(even) {{
-                    background-color: #f8f9fa;
-                }}
-                
-                .report-content tr:hover {{
-                    background-color: #e3f2fd;
-                }}
-                
-                .report-content ul, .report-content ol {{
-                    margin: 1rem 0;
-                    padding-left: 2rem;
-                }}
-                
-                .report-content li {{
-                    margin-bottom: 0.5rem;
-                    font-size: 1.1rem;
-                }}
-                
-                .report-content blockquote {{
-                    border-left: 4px solid #3498db;
-                    padding-left: 1.5rem;
-                    margin: 1.5rem 0;
-                    color: #6c757d;
-                    font-style: italic;
-                    background: #f8f9fa;
-                    padding: 1rem;
-                    border-radius: 0 8px 8px 0;
-                }}
-                
-                .report-footer {{
-                    background: #f8f9fa;
-                    padding: 2rem;
-                    text-align: center;
-                    border-top: 1px solid #e9ecef;
-                }}
-                
-                .report-footer p {{
-                    color: #6c757d;
-                    margin-bottom: 0.5rem;
-                }}
-                
-                .download-section {{
-                    text-align: center;
-                    margin: 2rem 0;
-                    padding: 2rem;
-                    background: #f8f9fa;
-                    border-radius: 8px;
-                }}
-                
-                .download-btn {{
-                    display: inline-block;
-                    background: #2874a6;
-                    color: white;
-                    padding: 1rem 2rem;
-                    text-decoration: none;
-                    border-radius: 8px;
-                    font-weight: 600;
-                    transition: all 0.3s ease;
-                    margin: 0.5rem;
-                    border: none;
-                    cursor: pointer;
-                    font-size: 1rem;
-                }}
-                
-                .download-btn:hover {{
-                    background: #1a5276;
-                    transform: translateY(-2px);
-                    box-shadow: 0 5px 15px rgba(0,0,0,0.2);
-                }}
-                
-                .print-btn {{
-                    background: #28a745;
-                }}
-                
-                .print-btn:hover {{
-                    background: #1e7e34;
-                }}
-                
-                @media print {{
-                    body {{
-                        background: white;
-                        padding: 0;
-                    }}
-                    .report-container {{
-                        box-shadow: none;
-                        border-radius: 0;
-                    }}
-                    .download-section {{
-                        display: none;
-                    }}
-                }}
-                
-                @media (max-width: 768px) {{
-                    body {{
-                        padding: 1rem;
-                    }}
-                    .report-header {{
-                        padding: 2rem 1rem;
-                    }}
-                    .report-header h1 {{
-                        font-size: 2rem;
-                    }}
-                    .report-content {{
-                        padding: 2rem 1rem;
-                    }}
-                    .report-content table {{
-                        font-size: 0.9rem;
-                    }}
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="report-container">
-                <div class="report-header">
-                    <h1>Program Assessment Report</h1>
-                    <h2>{institution_info.get('programName', 'Program Name')}</h2>
-                    <p>{institution_info.get('institutionName', 'Institution Name')}</p>
-                    <p>Generated on {datetime.now().strftime('%B %d, %Y')}</p>
-                </div>
-                
-                <div class="report-content">
-                    {html_content}
-                </div>
-                
-                <div class="download-section">
-                    <button class="download-btn" onclick="window.print()">
-                        <i class="fas fa-print"></i> Print Report
-                    </button>
-                    <button class="download-btn print-btn" onclick="downloadAsPDF()">
-                        <i class="fas fa-file-pdf"></i> Save as PDF
-                    </button>
-                </div>
-                
-                <div class="report-footer">
-                    <p><strong>Generated by AccreditAI</strong></p>
-                    <p>Developed by Prof. Yasser Mansour & Ahmed Yasser</p>
-                    <p>Prince Sultan University</p>
-                </div>
-            </div>
-            
-            <script>
-                function downloadAsPDF() {{
-                    // Simple PDF generation using browser's print to PDF
-                    window.print();
-                }}
-                
-                // Add smooth scrolling
-                document.querySelectorAll('a[href^="#"]').forEach(anchor => {{
-                    anchor.addEventListener('click', function (e) {{
-                        e.preventDefault();
-                        document.querySelector(this.getAttribute('href')).scrollIntoView({{
-                            behavior: 'smooth'
-                        }});
-                    }});
-                }});
-            </script>
-        </body>
-        </html>
-        """
-
-        return jsonify({"html_report": complete_html})
+        return _render_report_page(html_content, institution_info)
 
     except Exception as e:
         app.logger.error(f"Error generating HTML report: {str(e)}")
@@ -527,336 +888,131 @@ def share_report():
         report = data.get('report', '')
 
         # Generate HTML content from the Markdown report
-        html_report = markdown.markdown(report, extensions=['tables'])
-
-        # Create a beautiful HTML report page
-        complete_html = f"""
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Program Assessment Report - {institution_info.get('programName', 'Program')}</title>
-            <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap" rel="stylesheet">
-            <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css">
-            <style>
-                * {{
-                    margin: 0;
-                    padding: 0;
-                    box-sizing: border-box;
-                }}
-                
-                body {{
-                    font-family: 'Inter', Arial, Helvetica, sans-serif;
-                    line-height: 1.6;
-                    color: #2c3e50;
-                    background-color: #f8f9fa;
-                    padding: 2rem;
-                }}
-                
-                .report-container {{
-                    max-width: 1200px;
-                    margin: 0 auto;
-                    background: white;
-                    border-radius: 12px;
-                    box-shadow: 0 10px 30px rgba(0,0,0,0.1);
-                    overflow: hidden;
-                }}
-                
-                .report-header {{
-                    background: linear-gradient(135deg, #2874a6 0%, #3498db 100%);
-                    color: white;
-                    padding: 3rem 2rem;
-                    text-align: center;
-                }}
-                
-                .report-header h1 {{
-                    font-size: 2.5rem;
-                    font-weight: 700;
-                    margin-bottom: 1rem;
-                }}
-                
-                .report-header h2 {{
-                    font-size: 1.5rem;
-                    font-weight: 500;
-                    margin-bottom: 0.5rem;
-                    opacity: 0.9;
-                }}
-                
-                .report-header p {{
-                    font-size: 1.1rem;
-                    opacity: 0.8;
-                }}
-                
-                .report-content {{
-                    padding: 3rem 2rem;
-                }}
-                
-                .report-content h1 {{
-                    color: #2874a6;
-                    font-size: 2rem;
-                    margin-bottom: 1.5rem;
-                    padding-bottom: 1rem;
-                    border-bottom: 3px solid #3498db;
-                }}
-                
-                .report-content h2 {{
-                    color: #2874a6;
-                    font-size: 1.5rem;
-                    margin: 2rem 0 1rem;
-                    padding-bottom: 0.5rem;
-                    border-bottom: 1px solid #e9ecef;
-                }}
-                
-                .report-content h3 {{
-                    color: #2c3e50;
-                    font-size: 1.2rem;
-                    margin: 1.5rem 0 0.75rem;
-                }}
-                
-                .report-content p {{
-                    margin-bottom: 1rem;
-                    font-size: 1.1rem;
-                }}
-                
-                .report-content table {{
-                    width: 100%;
-                    border-collapse: collapse;
-                    margin: 1.5rem 0;
-                    background: white;
-                    border-radius: 8px;
-                    overflow: hidden;
-                    box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-                }}
-                
-                .report-content th {{
-                    background: #2874a6;
-                    color: white;
-                    padding: 1rem;
-                    text-align: left;
-                    font-weight: 600;
-                    font-size: 1rem;
-                }}
-                
-                .report-content td {{
-                    padding: 1rem;
-                    border-bottom: 1px solid #e9ecef;
-                    vertical-align: top;
-                }}
-                
-                .report-content tr:nth-child(even) {{
-                    background-color: #f8f9fa;
-                }}
-                
-                .report-content tr:hover {{
-                    background-color: #e3f2fd;
-                }}
-                
-                .report-content ul, .report-content ol {{
-                    margin: 1rem 0;
-                    padding-left: 2rem;
-                }}
-                
-                .report-content li {{
-                    margin-bottom: 0.5rem;
-                    font-size: 1.1rem;
-                }}
-                
-                .report-content blockquote {{
-                    border-left: 4px solid #3498db;
-                    padding-left: 1.5rem;
-                    margin: 1.5rem 0;
-                    color: #6c757d;
-                    font-style: italic;
-                    background: #f8f9fa;
-                    padding: 1rem;
-                    border-radius: 0 8px 8px 0;
-                }}
-                
-                .report-footer {{
-                    background: #f8f9fa;
-                    padding: 2rem;
-                    text-align: center;
-                    border-top: 1px solid #e9ecef;
-                }}
-                
-                .report-footer p {{
-                    color: #6c757d;
-                    margin-bottom: 0.5rem;
-                }}
-                
-                .download-section {{
-                    text-align: center;
-                    margin: 2rem 0;
-                    padding: 2rem;
-                    background: #f8f9fa;
-                    border-radius: 8px;
-                }}
-                
-                .download-btn {{
-                    display: inline-block;
-                    background: #2874a6;
-                    color: white;
-                    padding: 1rem 2rem;
-                    text-decoration: none;
-                    border-radius: 8px;
-                    font-weight: 600;
-                    transition: all 0.3s ease;
-                    margin: 0.5rem;
-                    border: none;
-                    cursor: pointer;
-                    font-size: 1rem;
-                }}
-                
-                .download-btn:hover {{
-                    background: #1a5276;
-                    transform: translateY(-2px);
-                    box-shadow: 0 5px 15px rgba(0,0,0,0.2);
-                }}
-                
-                .print-btn {{
-                    background: #28a745;
-                }}
-                
-                .print-btn:hover {{
-                    background: #1e7e34;
-                }}
-                
-                @media print {{
-                    body {{
-                        background: white;
-                        padding: 0;
-                    }}
-                    .report-container {{
-                        box-shadow: none;
-                        border-radius: 0;
-                    }}
-                    .download-section {{
-                        display: none;
-                    }}
-                }}
-                
-                @media (max-width: 768px) {{
-                    body {{
-                        padding: 1rem;
-                    }}
-                    .report-header {{
-                        padding: 2rem 1rem;
-                    }}
-                    .report-header h1 {{
-                        font-size: 2rem;
-                    }}
-                    .report-content {{
-                        padding: 2rem 1rem;
-                    }}
-                    .report-content table {{
-                        font-size: 0.9rem;
-                    }}
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="report-container">
-                <div class="report-header">
-                    <h1>Program Assessment Report</h1>
-                    <h2>{institution_info.get('programName', 'Program Name')}</h2>
-                    <p>{institution_info.get('institutionName', 'Institution Name')}</p>
-                    <p>Generated on {datetime.now().strftime('%B %d, %Y')}</p>
-                </div>
-                
-                <div class="report-content">
-                    {html_report}
-                </div>
-                
-                <div class="download-section">
-                    <button class="download-btn" onclick="window.print()">
-                        <i class="fas fa-print"></i> Print Report
-                    </button>
-                    <button class="download-btn print-btn" onclick="downloadAsPDF()">
-                        <i class="fas fa-file-pdf"></i> Save as PDF
-                    </button>
-                </div>
-                
-                <div class="report-footer">
-                    <p><strong>Generated by AccreditAI</strong></p>
-                    <p>Developed by Prof. Yasser Mansour & Ahmed Yasser</p>
-                    <p>Prince Sultan University</p>
-                </div>
-            </div>
-            
-            <script>
-                function downloadAsPDF() {{
-                    // Simple PDF generation using browser's print to PDF
-                    window.print();
-                }}
-                
-                // Add smooth scrolling
-                document.querySelectorAll('a[href^="#"]').forEach(anchor => {{
-                    anchor.addEventListener('click', function (e) {{
-                        e.preventDefault();
-                        document.querySelector(this.getAttribute('href')).scrollIntoView({{
-                            behavior: 'smooth'
-                        }});
-                    }});
-                }});
-            </script>
-        </body>
-        </html>
-        """
+        html_report = _render_markdown(report)
 
-        return jsonify({"html_report": complete_html})
+        return _render_report_page(html_report, institution_info)
 
     except Exception as e:
         app.logger.error(f"Error generating HTML report: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/metrics')
+def metrics():
+    # Under gunicorn each worker counts separately; with
+    # PROMETHEUS_MULTIPROC_DIR set the workers' counts are combined
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
 @app.route('/ask')
 def ask_page():
     return render_template('ask.html')
 
+# Fixed system prompt for /api/ask, built once rather than per request
+ASK_SYSTEM_PROMPT = """You are an accreditation consultant specializing in university program assessment.
+Provide clear, professional advice when answering questions about accreditation.
+
+Instructions:
+- Always give a clear, direct, and professional answer first.
+- If the question is factual (e.g., "which body," "how long," "what is"),
+provide only the factual answer with relevant details or examples.
+Do NOT add recommendations unless explicitly asked.
+- If the question is advisory (e.g., "how should we," "what steps," "ways to improve"),
+then provide practical, actionable recommendations aligned with accreditation standards.
+- When relevant, mention examples of accreditation bodies (ABET, AACSB, NCAAA, etc.)
+or best practices, but keep the focus on directly answering the question.
+- Avoid repeating definitions or explaining accreditation unless the question explicitly requests it.
+- Keep responses concise, professional, and to the point."""
+
+# Answers to recently asked questions, keyed on the normalized question text
+ASK_CACHE_TTL = 24 * 3600
+MAX_QUESTION_LENGTH = 4000
+_ask_cache = TTLCache(maxsize=1024, ttl=ASK_CACHE_TTL)
+_ask_cache_lock = threading.Lock()
+
+def _normalize_question(question):
+    """Lowercase, drop punctuation and collapse whitespace."""
+    question = re.sub(r"[^\w\s]", "", question.lower())
+    return re.sub(r"\s+", " ", question).strip()
+
+def _ask_request(question):
+    return {
+        "model": "gpt-4-turbo-preview",
+        "messages": [
+            {"role": "system", "content": ASK_SYSTEM_PROMPT},
+            {"role": "user", "content": question}
+        ],
+        "temperature": 0.7,
+        "max_tokens": 1000
+    }
+
+def _ask_lookup(key):
+    """Return ``(answer, vector)`` for a normalized question; answer is None on a miss."""
+    with _ask_cache_lock:
+        answer = _ask_cache.get(key)
+    if answer is not None:
+        OPENAI_CACHE_HITS.labels(cache="ask").inc()
+        return answer, None
+
+    # Paraphrases of earlier questions
+    answer, vector = ask_semantic_cache.lookup(key, "ask")
+    if answer is not None:
+        with _ask_cache_lock:
+            _ask_cache[key] = answer
+    return answer, vector
+
+def _ask_remember(key, answer, vector):
+    with _ask_cache_lock:
+        _ask_cache[key] = answer
+    ask_semantic_cache.store(key, answer, "ask", vector)
+
+def _ask_cached(question):
+    """Answer ``question``, reusing the answer to an equivalent earlier question."""
+    key = _normalize_question(question)
+    answer, vector = _ask_lookup(key)
+    if answer is None:
+        openai_limiter.acquire()
+        OPENAI_CALLS.inc()
+        response = client.chat.completions.create(**_ask_request(question))
+        choice = response.choices[0]
+        answer = choice.message.content
+        if answer and choice.finish_reason == 'stop':
+            _ask_remember(key, answer, vector)
+    return answer
+
 @app.route('/api/ask', methods=['POST'])
 def ask_ai():
     try:
         data = request.json
+        if not isinstance(data, dict):
+            return jsonify({"error": "request body must be a JSON object"}), 400
         question = data.get('question', '')
-
-        # Prepare the prompt for OpenAI
-        prompt = f"""You are an accreditation consultant specializing in university program assessment.
-
-                    Answer the following question about accreditation:
-
-                    Question: {question}
-
-                    Instructions:
-                    - Always give a clear, direct, and professional answer first. 
-                    - If the question is factual (e.g., "which body," "how long," "what is"), 
-                    provide only the factual answer with relevant details or examples. 
-                    Do NOT add recommendations unless explicitly asked. 
-                    - If the question is advisory (e.g., "how should we," "what steps," "ways to improve"), 
-                    then provide practical, actionable recommendations aligned with accreditation standards.
-                    - When relevant, mention examples of accreditation bodies (ABET, AACSB, NCAAA, etc.) 
-                    or best practices, but keep the focus on directly answering the question.
-                    - Avoid repeating definitions or explaining accreditation unless the question explicitly requests it.
-                    - Keep responses concise, professional, and to the point. """
-
-        response = client.chat.completions.create(
-            model="gpt-4-turbo-preview",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert in university program accreditation and assessment. Provide clear, professional advice."
-                },
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1000
-        )
-
-        return jsonify({"response": response.choices[0].message.content})
+        if not isinstance(question, str) or not question.strip() or len(question) > MAX_QUESTION_LENGTH:
+            return jsonify({"error": "invalid question"}), 400
+
+        # Stream the answer token by token, as for reports. Answers are kept
+        # only in the ask caches, as in the non-streamed path.
+        if request.args.get('mode') == 'stream':
+            key = _normalize_question(question)
+            answer, vector = _ask_lookup(key)
+            if answer is not None:
+                stream = iter([_sse(answer), _sse({}, event='done')])
+            else:
+                stream = _stream_completion(
+                    _ask_request(question),
+                    on_complete=lambda answer: _ask_remember(key, answer, vector),
+                    use_cache=False
+                )
+            return _sse_response(stream)
+
+        return jsonify({"response": _ask_cached(question)})
 
     except Exception as e:
         app.logger.error(f"Error in AI response: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
-    app.run(debug=True) 
\ No newline at end of file
+    # Local development only; production runs under gunicorn (see Procfile)
+    app.run(debug=os.getenv('FLASK_ENV') == 'development') 
\ No newline at end of file
@@ -0,0 +1,9 @@
+# Gunicorn settings for the web process (see Procfile)
+
+# The app is preloaded in the master, so the standard library has to be
+# patched for gevent before app.py is imported rather than after the workers
+# fork. Only gunicorn reads this file; the Celery worker and anything else
+# that imports app.py stay unpatched.
+from gevent import monkey
+
+monkey.patch_all()
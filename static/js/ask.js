@@ -23,7 +23,7 @@ async function handleSend() {
 
     try {
         // Send question to backend
-        const response = await fetch('/api/ask', {
+        const response = await fetch('/api/ask?mode=stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -35,9 +35,22 @@ async function handleSend() {
             throw new Error('Failed to get response');
         }
 
-        const data = await response.json();
-        hideLoading();
-        addMessage(data.response, 'bot');
+        // Show the answer as it streams in
+        let messageDiv = null;
+        const answer = await readEventStream(response, (partialAnswer) => {
+            if (!messageDiv) {
+                hideLoading();
+                messageDiv = addMessage(partialAnswer, 'bot');
+            } else {
+                messageDiv.textContent = partialAnswer;
+                chatMessages.scrollTop = chatMessages.scrollHeight;
+            }
+        });
+
+        if (!messageDiv) {
+            hideLoading();
+            addMessage(answer, 'bot');
+        }
 
     } catch (error) {
         console.error('Error:', error);
@@ -65,6 +78,7 @@ function addMessage(message, type) {
     }, 100);
     
     chatMessages.scrollTop = chatMessages.scrollHeight;
+    return messageDiv;
 }
 
 // Show loading indicator
@@ -403,10 +403,10 @@ async function generateReport() {
         const recommendationsData = await recommendationsResponse.json();
         state.recommendations = recommendationsData.recommendations;
 
-        // Then, generate the full report
+        // Then, stream the full report into the page as it is generated
         showLoading('Generating comprehensive report...');
         
-        const reportResponse = await fetch('/api/generate-report', {
+        const reportResponse = await fetch('/api/generate-report?mode=stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -422,21 +422,17 @@ async function generateReport() {
             throw new Error('Failed to generate report');
         }
 
-        const reportData = await reportResponse.json();
-        state.report = reportData.report;
+        let reportContent = null;
+        state.report = await readEventStream(reportResponse, (partialReport) => {
+            if (!reportContent) {
+                reportContent = showReportContainer();
+            }
+            reportContent.innerHTML = marked.parse(partialReport);
+        });
 
-        hideLoading();
-        
-        // Clear all previous content
-        clearMessages();
-        
-        // Create a container for the report
-        const reportContainer = document.createElement('div');
-        reportContainer.className = 'report-container';
-        
-        // Add the report content
-        const reportContent = document.createElement('div');
-        reportContent.className = 'report-content';
+        if (!reportContent) {
+            reportContent = showReportContainer();
+        }
         reportContent.innerHTML = marked.parse(state.report);
         
         // Style tables for better readability
@@ -463,28 +459,14 @@ async function generateReport() {
             });
         });
         
-        reportContainer.appendChild(reportContent);
-        
         // Add download button
         const downloadButton = document.createElement('button');
         downloadButton.className = 'download-button';
         downloadButton.innerHTML = '<i class="fas fa-download"></i> Download Report as PDF';
         downloadButton.onclick = downloadReport;
-        reportContainer.appendChild(downloadButton);
-        
-        // Hide the sidebar
-        document.querySelector('.sidebar').style.display = 'none';
-        
-        // Adjust the main container to full width
-        document.querySelector('.chat-container').style.marginLeft = '0';
-        document.querySelector('.chat-container').style.maxWidth = '1200px';
-        
-        chatMessages.appendChild(reportContainer);
+        reportContent.parentElement.appendChild(downloadButton);
         chatMessages.scrollTop = chatMessages.scrollHeight;
         
-        // Hide the input section
-        document.querySelector('.input-section').style.display = 'none';
-        
     } catch (error) {
         console.error('Error generating report:', error);
         hideLoading();
@@ -492,6 +474,36 @@ async function generateReport() {
     }
 }
 
+// Swap the chat for a full-width report view and return its content element
+function showReportContainer() {
+    hideLoading();
+    
+    // Clear all previous content
+    clearMessages();
+    
+    // Create a container for the report
+    const reportContainer = document.createElement('div');
+    reportContainer.className = 'report-container';
+    
+    const reportContent = document.createElement('div');
+    reportContent.className = 'report-content';
+    reportContainer.appendChild(reportContent);
+    
+    // Hide the sidebar
+    document.querySelector('.sidebar').style.display = 'none';
+    
+    // Adjust the main container to full width
+    document.querySelector('.chat-container').style.marginLeft = '0';
+    document.querySelector('.chat-container').style.maxWidth = '1200px';
+    
+    chatMessages.appendChild(reportContainer);
+    
+    // Hide the input section
+    document.querySelector('.input-section').style.display = 'none';
+    
+    return reportContent;
+}
+
 // Replace the downloadReport function (lines 496-543) with this:
 async function downloadReport() {
     try {
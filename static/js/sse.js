@@ -0,0 +1,38 @@
+// Read a server-sent event stream, calling onUpdate with the text so far
+async function readEventStream(response, onUpdate) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let text = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            return text;
+        }
+
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+
+        for (const event of events) {
+            const lines = event.split('\n');
+            const typeLine = lines.find(line => line.startsWith('event: '));
+            const type = typeLine ? typeLine.slice(7) : 'message';
+            const data = lines
+                .filter(line => line.startsWith('data: '))
+                .map(line => line.slice(6))
+                .join('\n');
+
+            if (type === 'error') {
+                throw new Error(JSON.parse(data));
+            }
+            if (type === 'done') {
+                return text;
+            }
+
+            text += JSON.parse(data);
+            onUpdate(text);
+        }
+    }
+}